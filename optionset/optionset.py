@@ -15,23 +15,30 @@ Email: matt.c.jones.aoe@gmail.com
 
 # Import files
 import argparse
+import io
 import logging
+import multiprocessing
 import os
 import re
+import shutil
 import sys
+import tempfile
+import threading
 
-from collections import defaultdict, namedtuple, OrderedDict
+from bisect import bisect_right
+from collections import namedtuple, OrderedDict
 from collections.abc import Callable, Generator
+from concurrent.futures import ProcessPoolExecutor
 from configparser import ConfigParser
 from contextlib import contextmanager
-from fnmatch import fnmatch
-from functools import wraps
-from io import TextIOWrapper
+from fnmatch import translate
+from functools import lru_cache, partial
+from itertools import accumulate
 from pathlib import Path
 from pprint import pformat
 from time import time
 from typing import Any, Dict, List, Match, Mapping,\
-    NoReturn, Tuple, Sequence, Union, cast
+    NoReturn, Pattern, Tuple, Sequence, Union, cast
 
 __author__ = "Matthew C. Jones"
 __version__ = "25.01.03"
@@ -48,6 +55,8 @@ ErrorType = Any  # IMPL 2022-04-18
 FileVarsDatabaseType = Any  # IMPL 2022-04-18
 # FileVarsDatabaseType = TypeVar('FileVarsDatabaseType')
 DbType = Dict[str, Dict[str, Union[str, bool, None]]]
+FilesDbType = Dict[str, List[str]]  # option and files where it is found
+MsgType = Union[str, Callable]  # message, or function that returns message
 NTType = Any
 
 # ############################################################ #
@@ -163,6 +172,7 @@ IGNORE_FILES = [BASENAME, LOG_NAME, BASHCOMP_NAME, CONFIG_NAME,
                 ]  # UNIX-based wild cards
 MAX_FLINES = 1000  # maximum lines per file
 MAX_FSIZE_KB = 100  # maximum file size, kilobytes (approx 10 Kb per 100 lines)
+MIN_FILES_PARALLEL = 100  # minimum number of files to process in parallel
 DEFAULT_CONFIG = {'ignore_dirs': IGNORE_DIRS, 'ignore_files': IGNORE_FILES,
                   'max_flines': MAX_FLINES, 'max_fsize_kb': MAX_FSIZE_KB, }
 
@@ -173,27 +183,44 @@ ANY_WORD = r'[a-zA-Z0-9._\-\+]+'
 ANY_RAW_OPTN = ANY_WORD
 ANY_QUOTE = r'[\'"]'
 ANY_VAR_SETTING = rf'\={ANY_QUOTE}.+{ANY_QUOTE}'
+VAR_SETTING_START = ("='", '="')  # start of a matched variable setting
 ANY_SETTING = rf'(?:{ANY_WORD}|{ANY_VAR_SETTING})'
 VALID_INPUT_SETTING = rf'(?: |{ANY_WORD})+'  # words with spaces (using '')
-BRACKETS = r'[()<>\[\]]'
-# Implicitely match tag. Do not include any of these:
-ANY_TAG = (rf'(?:(?!\s|{ANY_COMMENT_IND}|{MULTI_TAG}|{ANY_WORD}|{BRACKETS}'
-           rf'|{ANY_QUOTE}).)')
+# Implicitely match tag. Do not include any of these: whitespace, comment
+# indicators, multi-line tag, word characters, brackets, or quotes. A single
+# character class is used; '/' is only excluded when it starts '//'.
+ANY_TAG = r'''(?:[^\s#%!*a-zA-Z0-9._\-+()<>\[\]'"/]|/(?!/))'''
 # Explicitely specify tag with: ANY_TAG = r'[~@$^&\=\|\?]'
-WHOLE_COMMENT = (r'(?P<com_ind>{com_ind})'
-                 r'(?P<whole_com>.*\s+{mtag}*{tag}+{raw_opt}'
-                 r'\s+{setting}\s.*\n?)')
+WHOLE_COM = r'.*\s+{mtag}*{tag}+{raw_opt}\s+{setting}\s.*\n?'
+WHOLE_COMMENT = r'(?P<com_ind>{com_ind})(?P<whole_com>' + WHOLE_COM + ')'
 UNCOMMD_LINE = (r'^(?P<nested_com_inds>{nested_com_inds})'
                 r'(?P<non_com>\s*(?:(?!{com_ind}).)+)' + WHOLE_COMMENT)
-COMMD_LINE = (r'^(?P<nested_com_inds>{nested_com_inds})'
-              r'(?P<non_com>\s*{com_ind}(?:(?!{com_ind}).)+)' + WHOLE_COMMENT)
 ONLY_OPTN_SETTING = r'({mtag}*)({tag}+)({raw_opt})\s+({setting})\s?'
+# Option and setting within a line of a whole text
+TEXT_OPTN_SETTING = r'{mtag}*{tag}+{raw_opt}[^\S\n]+{setting}'
+# Input option or any multi-line option and setting within a whole text
+TEXT_SET_OPTN_SETTING = (r'(?:{option}|{mtag}+{tag}+{raw_opt})'
+                         r'[^\S\n]+{setting}')
 INLINE_OPTN_SETTING = r'((?:\s|{mtag}))({option})(\s+)({setting})((?:\s|$))'
 GENERIC_RE_VARS = {
     'com_ind': ANY_COMMENT_IND, 'mtag': MULTI_TAG, 'tag': ANY_TAG,
     'raw_opt': ANY_RAW_OPTN, 'setting': ANY_SETTING, 'nested_com_inds': ''
 }
 
+# Compiled regular expressions that do not depend on the file being processed
+COMMD_LINE_START_RE = re.compile(rf'^\s*({ANY_COMMENT_IND})', re.MULTILINE)
+ANY_UNCOMMD_LINE_RE = re.compile(UNCOMMD_LINE.format(**GENERIC_RE_VARS))
+WHOLE_COM_RE = re.compile(WHOLE_COM.format(**GENERIC_RE_VARS))
+ONLY_OPTN_SETTING_RE = re.compile(ONLY_OPTN_SETTING.format(**GENERIC_RE_VARS))
+TEXT_OPTN_SETTING_RE = re.compile(TEXT_OPTN_SETTING.format(**GENERIC_RE_VARS))
+# Compiled regular expressions to check user input
+INPUT_SETTING_RE = re.compile(rf'(^{VALID_INPUT_SETTING}$)')
+INPUT_OPTN_RE = re.compile(
+    "^({mtag}*)({tag}+)({raw_opt})$".format(**GENERIC_RE_VARS))
+# Compiled regular expressions to find command-line options in help
+SHORT_USAGE_RE = re.compile(r"\s(-\w+)")
+LONG_USAGE_RE = re.compile(r"\s(--[a-zA-Z\-]+)")
+
 # Error messages
 INCOMPLETE_INPUT_MSG = f'''InputError:
 Incomplete input. Try:
@@ -240,6 +267,41 @@ Remove the file or correct the errors.'''
 # Define classes
 # ############################################################ #
 
+InputDb = namedtuple('InputDb',
+                     ['tag', 'raw_opt', 'setting', 'f_available',
+                      'f_showfiles', 'f_bashcomp', 'rename_optn',
+                      'rename_setting', 'max_flines', 'max_fsize_kb',
+                      'clean_optn', 'clean_setting', ])
+
+# Options and settings found while processing a single file
+FileResult = namedtuple('FileResult',
+                        ['f_filemodified', 'optns_settings',
+                         'var_optns_values', 'showfiles_optns', ])
+
+
+class LogRecordCollector(logging.Handler):
+    """Logging handler that collects log records instead of emitting them,
+    so that a worker process can return its records to the main process.
+
+        records (List[logging.LogRecord]): Collected log records
+    """
+    def __init__(self) -> None:
+        """Initialize variables. """
+        super().__init__()
+        self.records: List[logging.LogRecord] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Store a picklable copy of the log record.
+
+        Args:
+            record (logging.LogRecord): Log record to collect
+        """
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        self.records.append(record)
+
+
 # class FileVarsDatabase(Generic[FileVarsDatabaseType]):  # DELETE
 class FileVarsDatabase():
     """Data structure to hold variables used in file processing.
@@ -255,19 +317,30 @@ class FileVarsDatabase():
         nested_lvl (int): Track level of nesting; +1 level every commented
             multi-line option
         nested_increment (int): Amount to incrememnt in nested level
-        com_ind (Union[str, None]): Comment indicator
-        re_vars (Mapping[str, str]): Regular expression strings
+        com_ind (str): Comment indicator
         nested_optn_db (Dict): Regular expression strings
+        optns_settings (List[Tuple[str, str, bool, bool]]): Option, setting,
+            active flag, and in-line ambiguity flag of each setting found
+        var_optns_values (List[Tuple[str, str]]): Variable option and value
+            of each variable setting found
+        showfiles_optns (List[str]): Options found, for showing files
     """
-    def __init__(self, filepath: Path, input_db: NTType) -> None:
+    __slots__ = ('filepath', 'input_db', 'com_ind', 'f_filemodified',
+                 'f_multiline_active', 'f_multicommd', 'nested_lvl',
+                 'nested_increment', 'nested_optn_db', 'optns_settings',
+                 'var_optns_values', 'showfiles_optns', )
+
+    def __init__(self, filepath: Path, input_db: NTType, com_ind: str) -> None:
         """Initialize variables.
 
         Args:
             filepath (Path): Path to input file
             input_db (NTType): Input database
+            com_ind (str): Comment indicator
         """
         self.filepath: Path = filepath
         self.input_db: NTType = input_db
+        self.com_ind: str = com_ind
 
         self.f_filemodified: bool = False
         self.f_multiline_active: bool = False
@@ -275,37 +348,38 @@ class FileVarsDatabase():
         self.nested_lvl: int = 0
         self.nested_increment: int = 0
 
-        # Get string that signifies a commented line
-        self.com_ind: str = cast(str, _get_comment_indicator(filepath))
-
-        # Prepare regular expressions
-        self.re_vars: Mapping[str, Any] = GENERIC_RE_VARS
-        self.re_vars['com_ind'] = self.com_ind  # set file-specific indicator
-
         # Prepare nested option database
         self.nested_optn_db: Dict = OrderedDict()
 
+        # Options and settings found in file
+        self.optns_settings: List[Tuple[str, str, bool, bool]] = []
+        self.var_optns_values: List[Tuple[str, str]] = []
+        self.showfiles_optns: List[str] = []
+
 
 # ############################################################ #
 # Define utility functions
 # ############################################################ #
 
-def _parse_args(
-    args_arr: Sequence[str]
-) -> Tuple[argparse.Namespace, argparse.ArgumentParser]:
-    """Parse arguments.
+@lru_cache(maxsize=None)
+def _build_parser(
+    description: str = SHORT_HELP_DESCRIPTION
+) -> argparse.ArgumentParser:
+    """Build argument parser.
+
+    The parser is built once per description and reused for repeated calls
+    of optionset from within a Python script.
 
     Args:
-        args (Sequence[str]): Argument array
+        description (str): Help description shown above the arguments
 
     Returns:
-        Tuple[argparse.Namespace, argparse.ArgumentParser]:
-            Parsed arguments array and parser object
+        argparse.ArgumentParser: Parser object
     """
     # Initialize parser and define arguments
     parser = argparse.ArgumentParser(
         formatter_class=argparse.RawDescriptionHelpFormatter, prog=RUNCMD,
-        description=SHORT_HELP_DESCRIPTION)
+        description=description)
     parser.add_argument(
         'option', metavar='option', nargs='?', type=str, default="",
         help='\'option\' name')
@@ -357,18 +431,35 @@ def _parse_args(
         '--auxiliary-dir', dest='aux_dir', type=str, default=AUX_DIR,
         help=argparse.SUPPRESS)
 
+    return parser
+
+
+def _parse_args(
+    args_arr: Sequence[str]
+) -> Tuple[argparse.Namespace, argparse.ArgumentParser]:
+    """Parse arguments.
+
+    Args:
+        args (Sequence[str]): Argument array
+
+    Returns:
+        Tuple[argparse.Namespace, argparse.ArgumentParser]:
+            Parsed arguments array and parser object
+    """
+    parser = _build_parser()
     args = parser.parse_args(args_arr)
 
     return args, parser
 
 
-def _print(msg: str) -> None:
+def _print(msg: str, *args: Any) -> None:
     """Log message and also print to console at default log level setting.
 
     Args:
-        msg (str): Message to print and log
+        msg (str): Message to print and log; formatted with args if given
+        *args (Any): Arguments merged into message by the logger
     """
-    logging.log(PRINT_LVL, msg)
+    logging.log(PRINT_LVL, msg, *args)
 
 
 def _setup_logging(args: argparse.Namespace) -> Path:
@@ -403,43 +494,50 @@ def _setup_logging(args: argparse.Namespace) -> Path:
         stream_handler.setLevel(PRINT_LVL)
     logging.getLogger().addHandler(stream_handler)
 
-    # Add custom log level intended to print output to console
-    logging.addLevelName(PRINT_LVL, 'PRINT')
-    logging.print = _print  # type: ignore
+    _add_print_level()
 
     return log_path
 
 
+def _add_print_level() -> None:
+    """Add custom log level intended to print output to console. """
+    logging.addLevelName(PRINT_LVL, 'PRINT')
+    logging.print = _print  # type: ignore
+
+
 def _exit() -> NoReturn:
     """Print exit message and exit program. """
     logging.warning("Exiting.")
     sys.exit()
 
 
-def _log_before_after_commenting(func: Callable) -> Callable:
-    """Wrapper to add file modifications to the log file.
+def _error_exit(msg: MsgType, err: BaseException) -> NoReturn:
+    """Print error message, log error, and exit program.
 
     Args:
-        func (Callable): Function to wrap
-
-    Returns:
-        Callable: Wrapped function
+        msg (MsgType): Message to output, or function that returns the message
+        err (BaseException): Error that occurred
     """
-    @wraps(func)
-    def log(*args_, **kwargs):
-        line_, line_num_ = args_[0], args_[1]
-        fmt_line_before_mod = '[{:>4} ]{}'.format(line_num_,
-                                                  line_.rstrip('\r\n'))
-        newline_ = func(*args_, **kwargs)
-        fmt_line_after_mod = '[{:>4}\']{}'.format(line_num_,
-                                                  newline_.rstrip('\r\n'))
+    logging.print(msg() if callable(msg) else msg)  # type: ignore
+    logging.debug(err)
+    _exit()
 
-        if line_ != newline_:
-            logging.info(fmt_line_before_mod)
-            logging.info(fmt_line_after_mod)
 
-        return newline_
-    return log
+def _log_before_after_commenting(
+    line: str,
+    newline: str,
+    line_num: int
+) -> None:
+    """Add a line modification to the log file.
+
+    Args:
+        line (str): Line before modification
+        newline (str): Line after modification
+        line_num (int): Line number
+    """
+    if logging.getLogger().isEnabledFor(logging.INFO):
+        logging.info('[{:>4} ]{}'.format(line_num, line.rstrip('\r\n')))
+        logging.info('[{:>4}\']{}'.format(line_num, newline.rstrip('\r\n')))
 
 
 def _uncomment(line: str, line_num: int, com_ind: str) -> str:
@@ -447,13 +545,15 @@ def _uncomment(line: str, line_num: int, com_ind: str) -> str:
 
     Args:
         line (str): Line to uncomment
-        line_num (int): Line number - called by function wrapper
+        line_num (int): Line number
         com_ind (str): String that denoates a comment (such as '#' for Python)
 
     Returns:
         str: Line that is now uncommented
     """
-    line = re.sub(rf'^(\s*)({com_ind})', r"\1", line)
+    indent_len = len(line) - len(line.lstrip())
+    if line.startswith(com_ind, indent_len):
+        line = line[:indent_len] + line[indent_len + len(com_ind):]
     return line
 
 
@@ -462,7 +562,7 @@ def _comment(line: str, line_num: int, com_ind: str) -> str:
 
     Args:
         line (str): Line to uncomment
-        line_num (int): Line number - called by function wrapper
+        line_num (int): Line number
         com_ind (str): String that denoates a comment (such as '#' for Python)
 
     Returns:
@@ -474,13 +574,14 @@ def _comment(line: str, line_num: int, com_ind: str) -> str:
 
 @contextmanager
 def _handle_errors(
-    err_types: Sequence[ErrorType], msg: str
+    err_types: Sequence[ErrorType], msg: MsgType
 ) -> Union[Generator, NoReturn]:
     """Use 'with:' to handle an error and print a message.
 
     Args:
         err_types (BaseException): List of error types to handle
-        msg (str): Message to output on error
+        msg (MsgType): Message to output on error, or function that returns
+            the message
 
     Returns:
         Union[None, NoReturn]: If error, exit after handling error, else None
@@ -488,15 +589,29 @@ def _handle_errors(
     try:
         yield
     except err_types as err:  # type: ignore
-        logging.print(msg)  # type: ignore
-        logging.debug(err)
-        _exit()
+        _error_exit(msg, err)
+
+
+@lru_cache(maxsize=None)
+def _get_cmd_opts_strs() -> Tuple[str, str]:
+    """Return command-line option names of this tool for Bash completion.
+
+    The names are parsed from the help message of the argument parser once.
+
+    Returns:
+        Tuple[str, str]: Quoted short and long command-line option names
+    """
+    help_str = _build_parser().format_help()
+    default_cmd_opts_short = [
+        f"'{opt}'" for opt in sorted(SHORT_USAGE_RE.findall(help_str))]
+    default_cmd_opts_long = [
+        f"'{opt}'" for opt in sorted(LONG_USAGE_RE.findall(help_str))]
+    return ' '.join(default_cmd_opts_short), ' '.join(default_cmd_opts_long)
 
 
 def _write_bashcompletion_file(
     ops_db: DbType,
     var_ops_db: DbType,
-    help_str: str,
     bashcomp_path: Path = AUX_DIR/BASHCOMP_NAME
 ) -> None:
     """Write file that can be sourced to enable tab completion for this tool.
@@ -504,19 +619,11 @@ def _write_bashcompletion_file(
     Args:
         ops_db (DbType): Options database
         var_ops_db (DbType): Options database for variable options
-        help_str (Mapping[str, str]): help Documentation to be parsed for
-            command-line option names
         bashcomp_path (Path): File path to store Bash
             completion settings
     """
-    re_short_usage = re.compile(r"\s(-\w+)")
-    re_long_usage = re.compile(r"\s(--[a-zA-Z\-]+)")
-    default_cmd_opts_short = [
-        f"'{opt}'" for opt in sorted(re_short_usage.findall(help_str))]
-    default_cmd_opts_long = [
-        f"'{opt}'" for opt in sorted(re_long_usage.findall(help_str))]
-    default_cmd_opts_short_str = ' '.join(default_cmd_opts_short)
-    default_cmd_opts_long_str = ' '.join(default_cmd_opts_long)
+    default_cmd_opts_short_str, default_cmd_opts_long_str \
+        = _get_cmd_opts_strs()
     file_contents_template = r"""#!/bin/bash
 # Auto-generated Bash completion settings for {base_run_cmd}
 # Run 'source {bashcomp_path}' to enable
@@ -548,12 +655,12 @@ complete -F _optionset {base_run_cmd}
 complete -F _optionset ./{base_run_cmd}
 complete -F _optionset {bashcomp_cmd}
 complete -F _optionset {bashcomp_cmd_b}"""
-    gathered_optns_str = ""
+    gathered_optns = []
     optns_with_settings_template = """
                 {optn_str})
                     COMPREPLY=($(compgen -W "{settings_str}" -- ${{cur}}))
                     ;;"""
-    optns_with_settings_str = ""
+    optns_with_settings = []
     bashcomp_cmd = BASHCOMP_CMD
     bashcomp_cmd_b = BASENAME_NO_EXT
     base_run_cmd = BASENAME
@@ -561,14 +668,13 @@ complete -F _optionset {bashcomp_cmd_b}"""
     for db in (ops_db, var_ops_db):
         for item in sorted(db.items()):
             optn_str = item[0].replace(r'$', r'\$')
-            gathered_optns_str += os.linesep
-            gathered_optns_str += f"                '{optn_str}'"
-            settings_str = ""
-            for sub_item in sorted(item[1].items()):
-                setting_str = sub_item[0]
-                settings_str += " " + f"'{setting_str}'"
-            optns_with_settings_str += \
-                optns_with_settings_template.format(**locals())
+            gathered_optns.append(f"{os.linesep}                '{optn_str}'")
+            settings_str = ''.join(f" '{setting_str}'"
+                                   for setting_str in sorted(item[1]))
+            optns_with_settings.append(optns_with_settings_template.format(
+                optn_str=optn_str, settings_str=settings_str))
+    gathered_optns_str = ''.join(gathered_optns)
+    optns_with_settings_str = ''.join(optns_with_settings)
 
     file_contents = file_contents_template.format(**locals())
 
@@ -577,14 +683,14 @@ complete -F _optionset {bashcomp_cmd_b}"""
         file_contents += "complete -F _optionset debug_os"
 
     with open(bashcomp_path, 'w', encoding='UTF-8') as file:
-        logging.info(f"Writing Bash completion settings to {bashcomp_path}")
+        logging.info("Writing Bash completion settings to %s", bashcomp_path)
         file.writelines(file_contents)
 
 
 def _print_available(
     ops_db: DbType,
     var_ops_db: DbType,
-    show_files_db: Union[DbType, None],
+    show_files_db: Union[FilesDbType, None],
     glob_pat: str = '*',
     f_available: bool = True
 ) -> None:
@@ -594,22 +700,24 @@ def _print_available(
     Args:
         ops_db (DbType): Options database
         var_ops_db (DbType): Options database for variable options
-        show_files_db (Union[DbType, None]): Database to store files that are
-            modified; optionally shown
+        show_files_db (Union[FilesDbType, None]): Database of files where
+            each option is found; optionally shown
         glob_pat (str): Glob-style pattern to match when searching
             options
         f_available (bool): True if showing available settings
     """
+    glob_re = _compile_globs((glob_pat,))
     common_files = []
-    body_msg = ""
+    body_parts = []
     num_optns = 0
     for db in (ops_db, var_ops_db):
-        logging.info(pformat(db, indent=1))
+        if logging.getLogger().isEnabledFor(logging.INFO):
+            logging.info(pformat(db, indent=1))
         for item in sorted(db.items()):
             optn_str = item[0]
-            if not fnmatch(optn_str, glob_pat):
+            if not glob_re.match(os.path.normcase(optn_str)):
                 continue
-            body_msg += os.linesep + f"  {optn_str}"
+            body_parts.append(f"{os.linesep}  {optn_str}")
             num_optns += 1
             if f_available:
                 for sub_item in sorted(item[1].items()):
@@ -624,18 +732,18 @@ def _print_available(
                         left_str, right_str = sub_item[1], sub_item[1]
                     else:
                         left_str, right_str = '?', '?'
-                    body_msg += os.linesep
-                    body_msg += f"\t{left_str} {setting_str} {right_str}"
+                    body_parts.append(
+                        f"{os.linesep}\t{left_str} {setting_str} {right_str}")
             if show_files_db is not None:
-                if show_files_db[optn_str]:
-                    files_str = ' '.join(show_files_db[optn_str].keys())
-                    body_msg += os.linesep + "  " + files_str + os.linesep
-                    body_msg += "-"*60
-                    for file in show_files_db[optn_str].keys():
-                        common_files.append(file)
+                optn_files = show_files_db.get(optn_str)
+                if optn_files:
+                    files_str = ' '.join(optn_files)
+                    body_parts.append(
+                        f"{os.linesep}  {files_str}{os.linesep}{'-'*60}")
+                    common_files.extend(optn_files)
 
     sub_hdr_msg = r"('  inactive  ', '> active <', '? both ?', '= variable =')"
-    if not body_msg:
+    if not body_parts:
         hdr_msg = f"No available options and settings matching '{glob_pat}'"
     else:
         hdr_msg = ("Showing available options and settings matching "
@@ -644,15 +752,49 @@ def _print_available(
 
     # Find files common to all options
     if show_files_db is not None and num_optns > 1:
-        common_files_str = "  Common files:" + os.linesep + "  "
-        for common_file in sorted(set(common_files)):
-            common_files_str += str(common_file).lstrip("'").rstrip("'") + " "
-        body_msg += os.linesep + common_files_str
+        common_files_str = ''.join(
+            str(common_file).lstrip("'").rstrip("'") + " "
+            for common_file in sorted(set(common_files)))
+        body_parts.append(
+            f"{os.linesep}  Common files:{os.linesep}  {common_files_str}")
 
-    full_msg = hdr_msg + body_msg
+    full_msg = hdr_msg + ''.join(body_parts)
     logging.print(full_msg)  # type: ignore
 
 
+def _find_unescaped(string: str, char: str) -> int:
+    """Find first index of character in a regular expression that is not
+    escaped by a backslash nor within a character class such as '[^;)]'.
+
+    Args:
+        string (str): Regular expression to search
+        char (str): Character to find
+
+    Returns:
+        int: Index of character, or -1 if not found
+    """
+    idx = 0
+    f_in_class = False
+    while idx < len(string):
+        if string[idx] == '\\':
+            idx += 2  # skip escaped character
+            continue
+        if f_in_class:
+            f_in_class = string[idx] != ']'
+        elif string[idx] == '[':
+            f_in_class = True
+            idx += 1
+            if string.startswith('^', idx):
+                idx += 1
+            if string.startswith(']', idx):  # literal ']' starts the class
+                idx += 1
+            continue
+        elif string[idx] == char:
+            return idx
+        idx += 1
+    return -1
+
+
 def _add_left_right_groups(inline_re: str) -> str:
     r"""Add left and right groups to regex.
     For example: \( (.*) 0 0 \) becomes (\( )(.*)( 0 0 \))
@@ -663,11 +805,8 @@ def _add_left_right_groups(inline_re: str) -> str:
     Returns:
         str: Modified inline regular expression
     """
-    # Must add one to get rid of preceding character match
-    left_paren_ind = re.search(
-        r'[^\\]([\(])', inline_re).start() + 1  # type: ignore
-    right_paren_ind = re.search(
-        r'[^\\]([\)])', inline_re).start() + 1  # type: ignore
+    left_paren_ind = _find_unescaped(inline_re, '(')
+    right_paren_ind = _find_unescaped(inline_re, ')')
     left = inline_re[:left_paren_ind]
     mid = inline_re[left_paren_ind:right_paren_ind + 1]
     right = inline_re[right_paren_ind + 1:]
@@ -689,7 +828,7 @@ def _set_var_optn(
 
     Args:
         line (str): Line to uncomment
-        line_num (int): Line number - called by function wrapper
+        line_num (int): Line number
         com_ind (str): String that denoates a comment (such as '#' for Python)
         str_to_replace (str): String to replace
         setting (str): Setting
@@ -697,15 +836,14 @@ def _set_var_optn(
         non_com (str): Portion of line that is not a comment
         whole_com (str): Portion of line that is the whole comment
     """
-    # Add 2 new groups, one for the left side and the other for the right
-    inline_re = _strip_setting_regex(setting)
-    logging.info(f"Setting variable option:{inline_re}:{str_to_replace}")
-    new_inline_re = _add_left_right_groups(inline_re)
+    logging.info("Setting variable option:%s:%s",
+                 _strip_setting_regex(setting), str_to_replace)
+    new_inline_re = _compile_set_var_regex(setting)
 
     def surround_var_str(re_match):
         """Surround variable option string with proper text. """
         return re_match.group(1) + str_to_replace + re_match.group(3)
-    new_non_com = re.sub(new_inline_re, surround_var_str, non_com)
+    new_non_com = new_inline_re.sub(surround_var_str, non_com)
     newline = nested_com_inds + new_non_com + com_ind + whole_com
     return newline
 
@@ -717,67 +855,123 @@ def _skip_file_warning(filename: Path, reason: str) -> None:
         filename (Path): Name of file
         reason (str): Reason for skipping file
     """
-    logging.info(f"Skipping: {filename}\n\t{reason}")
+    logging.info("Skipping: %s\n\t%s", filename, reason)
+
 
+def _read_text(filename: Path, line_limit: int) -> Union[str, None]:
+    """Read the text of a file in one pass unless the file is not UTF-8
+    encoded (binary) or exceeds the line limit.
 
-def _yield_utf8(file: TextIOWrapper) -> Generator[str, None, None]:
-    """Yield file lines only if they are UTF-8 encoded (non-binary).
+    Line endings are translated to '\\n' as when reading in text mode.
 
     Args:
-        file (TextIOWrapper): Filestream to read from
+        filename (Path): File to read text from
+        line_limit (int): Maximum line limit in file
 
-    Yields:
-        Generator[str, None, None]: file lines yielded one by one
+    Returns:
+        Union[str, None]: Text of the file, or None if file is skipped
     """
+    with open(filename, 'rb') as file:
+        data = file.read()
     try:
-        for line in file:
-            yield line
+        text = data.decode('UTF-8')
     except UnicodeDecodeError as err:
-        _skip_file_warning(Path(file.name), str(err))
+        _skip_file_warning(filename, str(err))
+        return None
+    if '\r' in text:  # universal newlines
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
 
+    num_lines = text.count('\n') + (text[-1:] not in ('\n', ''))
+    if num_lines > line_limit:
+        reason_str = f"File exceeds line limit of {line_limit}"
+        _skip_file_warning(filename, reason=reason_str)
+        return None
 
-def _line_count(filename: Path, line_limit: int) -> int:
-    """Return number of lines in a file unless file exceeds line limit.
+    return text
+
+
+def _write_temp_copy(real_path: str, text: str, file_stat: Any) -> str:
+    """Write text to a temporary file with the mode and owner of a file.
 
     Args:
-        filename (Path): File to count lines from
-        line_limit (int): Maximum line limit in file
+        real_path (str): File to copy the mode and owner of
+        text (str): Text to write
+        file_stat (Any): os.stat result of the file
 
     Returns:
-        int: Number of lines in the file
+        str: Path of the temporary file, in the directory of the file
+    """
+    dirname, basename = os.path.split(real_path)
+    fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix=f".{basename}.",
+                                    suffix='.tmp')
+    try:
+        with open(fd, 'w', encoding='UTF-8') as file:
+            file.write(text)
+        shutil.copymode(real_path, tmp_path)
+        owner = (file_stat.st_uid, file_stat.st_gid)
+        tmp_stat = os.stat(tmp_path)
+        if (tmp_stat.st_uid, tmp_stat.st_gid) != owner:
+            os.chown(tmp_path, *owner)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return tmp_path
+
+
+def _write_text(filename: Path, text: str) -> None:
+    """Write text to a file atomically by replacing it with a temporary file.
+
+    The replacement keeps the mode, owner, and group of the file. The file
+    is instead written in place, which is not atomic, if it has hard links,
+    or if the temporary file cannot be created or given the same owner,
+    such as in a directory that is not writable.
+
+    Args:
+        filename (Path): File to write to; symbolic links are followed
+        text (str): Text to write
     """
-    linecount = 0
-    with open(filename, 'r', encoding='UTF-8') as file:
-        for _ in _yield_utf8(file):
-            linecount += 1
-            if linecount > line_limit:
-                return linecount + 1  # return line limit +1
-    return linecount
+    real_path = os.path.realpath(filename)
+    file_stat = os.stat(real_path)
+    tmp_path = None
+    if file_stat.st_nlink == 1:  # replacing would break other hard links
+        try:
+            tmp_path = _write_temp_copy(real_path, text, file_stat)
+        except OSError:  # write in place instead
+            pass
+    if tmp_path is None:
+        with open(real_path, 'w', encoding='UTF-8') as file:
+            file.write(text)
+        return
+    try:
+        os.replace(tmp_path, real_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
 
 
-def _get_comment_indicator(filename: Path) -> Union[str, None]:
-    """Get comment indicator from filename ('#', '%', '!', '//', or '--').
+def _get_comment_indicator(
+    text: str,
+    lines: Sequence[str]
+) -> Union[str, None]:
+    """Get comment indicator from file text ('#', '%', '!', '//', or '--').
 
     Args:
-        filename (Path): filename to extract comment indicator from
+        text (str): file text to extract comment indicator from
+        lines (Sequence[str]): lines of the file text
 
     Returns:
-        Union[str, None]: None unless error is raised
+        Union[str, None]: Comment indicator, or None if no comment is found
     """
-    with open(filename, 'r', encoding='UTF-8') as file:
-        commd_line_re = re.compile(rf'^\s*({ANY_COMMENT_IND}).*')
-        for line in _yield_utf8(file):
-            search_commd_line = commd_line_re.search(line)
-            if search_commd_line:
-                return search_commd_line.group(1)
-
-        logging.debug('Comment not found at start of line. Searching in-line.')
-        uncommd_line_re = re.compile(UNCOMMD_LINE.format(**GENERIC_RE_VARS))
-        file.seek(0)  # restart file
-        for line in _yield_utf8(file):
-            search_uncommd_line = uncommd_line_re.search(line)
-            if search_uncommd_line:
-                return search_uncommd_line.group('com_ind')
+    # Search the whole text for the first line starting with a comment
+    search_commd_line = COMMD_LINE_START_RE.search(text)
+    if search_commd_line:
+        return search_commd_line.group(1)
+
+    logging.debug('Comment not found at start of line. Searching in-line.')
+    for line in lines:
+        search_uncommd_line = ANY_UNCOMMD_LINE_RE.search(line)
+        if search_uncommd_line:
+            return search_uncommd_line.group('com_ind')
 
     return None
 
@@ -791,9 +985,15 @@ def _check_varop_groups(re_str: str) -> Union[None, NoReturn]:
     Returns:
         Union[None, NoReturn]: None unless error is raised
     """
-    all_groups = re.findall(r'([^\\]\(.*?[^\\]\))', re_str)
-    if all_groups:
-        if len(all_groups) > 1:
+    try:
+        num_groups = re.compile(re_str).groups
+    except re.error as err:
+        logging.print(INVALID_REGEX_GROUP_MSG.format(  # type: ignore
+            specific_problem=f'Invalid regular expression: {err}'))
+        raise AttributeError
+
+    if num_groups:
+        if num_groups > 1:
             logging.print(INVALID_REGEX_GROUP_MSG.format(  # type: ignore
                 specific_problem='More than one regex group \'()\' found'))
             raise AttributeError
@@ -805,6 +1005,59 @@ def _check_varop_groups(re_str: str) -> Union[None, NoReturn]:
         raise AttributeError
 
 
+def _split_line(
+    line: str,
+    com_ind: str,
+    nested_lvl: int
+) -> Union[Tuple[str, str, str, bool], None]:
+    """Split line into nested comment indicators, non-commented part, and
+    whole comment containing an option and setting.
+
+    The non-commented part runs up to the first comment indicator, which is
+    located with str.find rather than a per-character regex lookahead. A
+    commented line is tried before an uncommented one.
+
+    Args:
+        line (str): Line to split
+        com_ind (str): String that denoates a comment (such as '#' for Python)
+        nested_lvl (int): Level of nesting of multi-line options
+
+    Returns:
+        Union[Tuple[str, str, str, bool], None]: Nested comment indicators,
+            non-commented part, whole comment, and True if line is commented,
+            or None if line does not contain a commented option and setting
+    """
+    # Each nested level adds a comment indicator, optionally indented
+    nested_end = 0
+    for _ in range(nested_lvl):
+        nested_end = len(line) - len(line[nested_end:].lstrip())
+        if not line.startswith(com_ind, nested_end):
+            return None
+        nested_end += len(com_ind)
+    indent_end = len(line) - len(line[nested_end:].lstrip())
+
+    # Commented line; comment follows the next comment indicator
+    if line.startswith(com_ind, indent_end):
+        code_start = indent_end + len(com_ind)
+        com_start = line.find(com_ind, code_start)
+        if com_start > code_start:
+            whole_com_match = WHOLE_COM_RE.match(line,
+                                                 com_start + len(com_ind))
+            if whole_com_match:
+                return (line[:nested_end], line[nested_end:com_start],
+                        whole_com_match.group(), True)
+
+    # Uncommented line
+    com_start = line.find(com_ind, nested_end)
+    if com_start > nested_end:
+        whole_com_match = WHOLE_COM_RE.match(line, com_start + len(com_ind))
+        if whole_com_match:
+            return (line[:nested_end], line[nested_end:com_start],
+                    whole_com_match.group(), False)
+
+    return None
+
+
 def _strip_setting_regex(setting_str: str) -> str:
     """Return in-line regular expression using setting.
 
@@ -814,10 +1067,60 @@ def _strip_setting_regex(setting_str: str) -> str:
     return setting_str[2:-1]  # remove surrounding =''
 
 
+@lru_cache(maxsize=None)
+def _compile_text_set_optn_regex(optn: str) -> Pattern:
+    """Compile regular expression to find lines that can change when setting
+    an option.
+
+    Args:
+        optn (str): Literal option being set, including its tag
+
+    Returns:
+        Pattern: Compiled regular expression matching the option, or any
+            multi-line option, followed by a setting
+    """
+    return re.compile(TEXT_SET_OPTN_SETTING.format(
+        **{**GENERIC_RE_VARS, 'option': re.escape(optn)}))
+
+
+@lru_cache(maxsize=None)
+def _compile_inline_regex(setting: str) -> Pattern:
+    """Check and compile in-line regular expression of a variable setting.
+
+    The same variable settings recur across lines and files, so compiled
+    expressions are cached.
+
+    Args:
+        setting (str): Variable setting containing in-line regex
+
+    Returns:
+        Pattern: Compiled in-line regular expression
+    """
+    inline_re = _strip_setting_regex(setting)
+    _check_varop_groups(inline_re)
+    return re.compile(inline_re)
+
+
+@lru_cache(maxsize=None)
+def _compile_set_var_regex(setting: str) -> Pattern:
+    """Compile in-line regular expression of a variable setting, with added
+    groups to replace the variable value.
+
+    Args:
+        setting (str): Variable setting containing in-line regex
+
+    Returns:
+        Pattern: Compiled in-line regular expression with left, variable,
+            and right groups
+    """
+    # Add 2 new groups, one for the left side and the other for the right
+    return re.compile(_add_left_right_groups(_strip_setting_regex(setting)))
+
+
 def _parse_inline_regex(
     non_commented_text: str,
     setting: str,
-    var_err_msg: str = ""
+    var_err_msg: MsgType = ""
 ):
     """Parse variable option value using user-defined regular expression
     stored in 'setting'.
@@ -825,29 +1128,74 @@ def _parse_inline_regex(
     Args:
         non_commented_text (str): Portion of text that is not a comment
         setting (str): Setting to search for
-        var_err_msg (str): Optional error message. Defaults to "".
+        var_err_msg (MsgType): Optional error message, or function that
+            returns it. Defaults to "".
 
     Returns:
         str: Portion of line to replace
     """
     # Attribute handles regex fail. Index handles .group() fail
-    with _handle_errors(err_types=(AttributeError, IndexError),
-                        msg=var_err_msg):
-        inline_re = _strip_setting_regex(setting)
-        _check_varop_groups(inline_re)
-        str_to_replace = cast(Match,
-                              re.search(inline_re, non_commented_text)
-                              ).group(1)
+    try:
+        str_to_replace = cast(Match, _compile_inline_regex(setting).search(
+            non_commented_text)).group(1)
+    except (AttributeError, IndexError) as err:
+        _error_exit(var_err_msg, err)
     return str_to_replace
 
 
-@_log_before_after_commenting  # requires line, line_num as first args
+@lru_cache(maxsize=None)
+def _compile_rename_regex(option: str, setting: str) -> Pattern:
+    """Compile regular expression to rename an option or setting in-line.
+
+    Args:
+        option (str): Option regular expression, including its tag
+        setting (str): Setting regular expression
+
+    Returns:
+        Pattern: Compiled in-line regular expression
+    """
+    return re.compile(INLINE_OPTN_SETTING.format(mtag=MULTI_TAG,
+                                                 option=option,
+                                                 setting=setting))
+
+
+def _rename_optn_setting(
+    whole_com: str,
+    inp: NTType,
+    f_inline_optn_match: bool,
+    f_inline_setting_match: bool
+) -> Union[str, None]:
+    """Rename input option and/or setting within the comment of a line.
+
+    Args:
+        whole_com (str): Portion of line that is the whole comment
+        inp (NTType): Input database
+        f_inline_optn_match (bool): True if input option is in the comment
+        f_inline_setting_match (bool): True if input option and setting are
+            in the comment
+
+    Returns:
+        Union[str, None]: Renamed comment, or None if nothing is renamed
+    """
+    new_whole_com = None
+    if f_inline_optn_match and inp.rename_optn:
+        rename_re = _compile_rename_regex(inp.tag+inp.raw_opt, ANY_SETTING)
+        new_whole_com = rename_re.sub(rf"\1{inp.rename_optn}\3\4\5",
+                                      whole_com)
+
+    if f_inline_setting_match and inp.rename_setting:
+        optn = inp.rename_optn if inp.rename_optn else inp.tag+inp.raw_opt
+        rename_re = _compile_rename_regex(optn, inp.setting)
+        new_whole_com = rename_re.sub(
+            rf"\1\2\3{inp.rename_setting}\5",
+            whole_com if new_whole_com is None else new_whole_com)
+
+    return new_whole_com
+
+
 def _process_line(line: str,
                   line_num: int,
-                  fdb: FileVarsDatabaseType,
-                  optns_settings_db: DbType,
-                  var_optns_values_db: DbType,
-                  show_files_db: DbType
+                  fdb: FileVarsDatabaseType
                   ) -> str:
     """Apply logic and process options/settings in a single line of the current
     file.  This is the heart of the code.
@@ -879,89 +1227,75 @@ def _process_line(line: str,
                 active, while '@option_a setting_b' and '@option_b setting_b'
                 are inactive.
 
+    Options and settings found in the line are recorded in the file variables
+    database.
+
     Args:
         line (str): Line to operate on
         line_num (int): Line number within file
         fdb (FileVarsDatabaseType): File variables database
-        optns_settings_db (DbType): Option + settings database
-        var_optns_values_db (DbType): Variable options + values database
-        show_files_db (DbType): Files to show database
 
     Returns:
         str: new line
     """
-    newline = line
-    inp = fdb.input_db
-    var_err_msg = INVALID_VAR_REGEX_MSG.format(filename=fdb.filepath,
-                                               line_num=line_num, line=line)
-
     # Adjust nested level
     fdb.nested_lvl += fdb.nested_increment
     fdb.nested_increment = 0  # reset
-    fdb.re_vars['nested_com_inds'] = rf"\s*{fdb.com_ind}" * fdb.nested_lvl
-
-    # Identify components of line based on regular expressions
-    commd_line_re = re.compile(COMMD_LINE.format(**fdb.re_vars))
-    uncommd_line_re = re.compile(UNCOMMD_LINE.format(**fdb.re_vars))
-    tag_optn_setting_re = re.compile(ONLY_OPTN_SETTING.format(**fdb.re_vars))
-    commd_line_match = commd_line_re.search(line)
-    uncommd_line_match = uncommd_line_re.search(line)
-    if commd_line_match:  # must search for commented before uncommented
-        nested_com_inds, non_com, whole_com =\
-            commd_line_match.group('nested_com_inds', 'non_com', 'whole_com')
-    elif uncommd_line_match:
-        nested_com_inds, non_com, whole_com =\
-            uncommd_line_match.group('nested_com_inds', 'non_com', 'whole_com')
+
+    # Identify components of line
+    line_parts = _split_line(line, fdb.com_ind, fdb.nested_lvl)
+    if line_parts:
+        nested_com_inds, non_com, whole_com, f_comment = line_parts
+        tag_optn_setting_matches = ONLY_OPTN_SETTING_RE.findall(whole_com)
     else:
         nested_com_inds, non_com, whole_com = "", "", ""
-    f_comment = bool(commd_line_match)
-    tag_optn_setting_matches = tag_optn_setting_re.findall(whole_com)
+        f_comment = False
+        tag_optn_setting_matches = []
+
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug("LINE[%d](L%1d,%.1s)(%s,%.1s):%s", line_num,
+                      fdb.nested_lvl, fdb.f_multiline_active, fdb.com_ind,
+                      f_comment, line[:-1])
 
-    logging.debug(f"LINE[{line_num}](L{fdb.nested_lvl:1},"
-                  f"{str(fdb.f_multiline_active)[0]})"
-                  f"({fdb.com_ind},{str(f_comment)[0]}):{line[:-1]}")
+    # A line without options only changes within an active multi-line option
+    if not (tag_optn_setting_matches or fdb.f_multiline_active):
+        return line
 
-    # Parse commented part of line; determine inline matches
-    inline_optn_count: Dict[str, int] = defaultdict(lambda: 0)
-    inline_optn_match: Dict[str, bool] = defaultdict(lambda: False)
-    inline_setting_match: Dict[str, bool] = defaultdict(lambda: False)
+    newline = line
+    inp = fdb.input_db
+    # Error message is only formatted if an error occurs
+    var_err_msg = partial(INVALID_VAR_REGEX_MSG.format, filename=fdb.filepath,
+                          line_num=line_num, line=line)
+
+    # Parse commented part of line; determine inline matches. Only the input
+    # option can match, so matches are tracked with flags. Occurances of
+    # options are only counted if the line has more than one option.
+    inline_optn_count: Dict[str, int] = {}
+    f_multi_optns = len(tag_optn_setting_matches) > 1
     f_inline_optn_match = False
     f_inline_setting_match = False
     for mtag, tag, raw_opt, setting in tag_optn_setting_matches:
+        optn = tag + raw_opt
         # Build database of related file locations
         if inp.f_showfiles:
-            show_files_db[tag+raw_opt][str(fdb.filepath)] = True
+            fdb.showfiles_optns.append(optn)
         # Count occurances of option
-        inline_optn_count[tag+raw_opt] += 1
-        if (inp.tag+inp.raw_opt).replace('\\', '') == tag+raw_opt:
-            inline_optn_match[tag+raw_opt] = True
+        if f_multi_optns:
+            count = inline_optn_count.get(optn, 0)
+            inline_optn_count[optn] = count + 1
+        if inp.clean_optn == optn:
             f_inline_optn_match = True
-            if inp.setting.replace('\\', '') == setting:
-                inline_setting_match[tag+raw_opt] = True
+            if inp.clean_setting == setting:
                 f_inline_setting_match = True
 
     # If renaming an option or setting
     if inp.rename_optn or inp.rename_setting:
-        if f_inline_optn_match and inp.rename_optn:
-            re_str = INLINE_OPTN_SETTING.format(mtag=MULTI_TAG,
-                                                option=inp.tag+inp.raw_opt,
-                                                setting=ANY_SETTING)
-            new_whole_com = re.sub(re_str, rf"\1{inp.rename_optn}\3\4\5",
-                                   whole_com)
+        new_whole_com = _rename_optn_setting(whole_com, inp,
+                                             f_inline_optn_match,
+                                             f_inline_setting_match)
+        if new_whole_com is not None:
             newline = nested_com_inds + non_com + fdb.com_ind + new_whole_com
             fdb.f_filemodified = True
-        else:
-            new_whole_com = whole_com
-
-        if f_inline_setting_match and inp.rename_setting:
-            optn = inp.rename_optn if inp.rename_optn else inp.tag+inp.raw_opt
-            re_str = INLINE_OPTN_SETTING.format(mtag=MULTI_TAG,
-                                                option=optn,
-                                                setting=inp.setting)
-            newer_whole_com = re.sub(re_str, rf"\1\2\3{inp.rename_setting}\5",
-                                     new_whole_com)
-            newline = nested_com_inds + non_com + fdb.com_ind + newer_whole_com
-            fdb.f_filemodified = True
 
         return newline
 
@@ -978,8 +1312,9 @@ def _process_line(line: str,
 
     # All other required logic based on matches in line
     for mtag, tag, raw_opt, setting in tag_optn_setting_matches:
-        logging.debug(f"\tMATCH(freeze={str(f_freeze_changes)[0]}):"
-                      f"{mtag}{tag}{raw_opt} {setting}")
+        optn = tag + raw_opt
+        logging.debug("\tMATCH(freeze=%.1s):%s%s %s", f_freeze_changes,
+                      mtag, optn, setting)
         # Skip rest of logic if change-freeze is set
         if f_freeze_changes:
             continue
@@ -987,18 +1322,19 @@ def _process_line(line: str,
         # Logic for determining levels for nested options
         if mtag:  # multitag present in line
             if f_comment:
-                fdb.nested_optn_db[fdb.nested_lvl] = tag+raw_opt
+                fdb.nested_optn_db[fdb.nested_lvl] = optn
                 fdb.nested_increment = 1
             else:  # uncommented
                 if len(fdb.nested_optn_db) < 1:
                     pass
-                elif fdb.nested_optn_db[fdb.nested_lvl-1] == tag+raw_opt:
+                elif fdb.nested_optn_db[fdb.nested_lvl-1] == optn:
                     fdb.nested_optn_db.pop(fdb.nested_lvl-1)
                     fdb.nested_increment = -1
                     f_comment = True
                     fdb.f_multiline_active = False
                     f_freeze_changes = True
-                    if inline_setting_match[tag+raw_opt]:
+                    if f_inline_setting_match and\
+                            inp.clean_optn == optn:
                         # Uncomment if match input setting
                         newline = _uncomment(line, line_num, fdb.com_ind)
                     continue
@@ -1008,24 +1344,19 @@ def _process_line(line: str,
         # Build database of available options and settings
         if inp.f_available or inp.f_showfiles or inp.f_bashcomp:
             # Determine active, inactive, and simultaneous options
-            if re.search(ANY_VAR_SETTING, setting) and not f_comment:
+            if setting.startswith(VAR_SETTING_START) and not f_comment:
                 str_to_replace = _parse_inline_regex(non_com, setting,
                                                      var_err_msg)
-                var_optns_values_db[tag+raw_opt][str_to_replace] = '='
-            elif optns_settings_db[tag+raw_opt][setting] is None:
-                if inline_optn_count[tag+raw_opt] > 1:
-                    optns_settings_db[tag+raw_opt][setting] = None
-                else:
-                    optns_settings_db[tag+raw_opt][setting] = (not f_comment)
-            elif optns_settings_db[tag+raw_opt][setting] != (not f_comment):
-                optns_settings_db[tag+raw_opt][setting] = '?'  # ambiguous
+                fdb.var_optns_values.append((optn, str_to_replace))
             else:
-                pass
+                fdb.optns_settings.append(
+                    (optn, setting, not f_comment,
+                     inline_optn_count.get(optn, 1) > 1))
 
         # Modify line based on user input and regular expression matches
         if not (inp.f_available or inp.f_showfiles):
             # Match input option (tag+raw_opt)
-            if (inp.tag+inp.raw_opt).replace('\\', '') == tag+raw_opt:
+            if inp.clean_optn == optn:
                 if f_comment:  # commented line
                     if inp.setting == setting:  # match input setting
                         # Uncomment lines with input tag+raw_opt and setting
@@ -1040,23 +1371,23 @@ def _process_line(line: str,
                         pass
                 else:  # uncommented line
                     # If variable option, use input regex to modify line
-                    if re.search(ANY_VAR_SETTING, setting):
+                    if setting.startswith(VAR_SETTING_START):
                         str_to_replace = _parse_inline_regex(non_com, setting,
                                                              var_err_msg)
                         replace_str = inp.setting
                         if replace_str == str_to_replace:
-                            logging.info(f"Option already set: {replace_str}")
+                            logging.info("Option already set: %s", replace_str)
                         else:
-                            with _handle_errors(err_types=(AttributeError,),
-                                                msg=var_err_msg):
+                            try:
                                 newline = _set_var_optn(
                                     line, line_num, fdb.com_ind, replace_str,
                                     setting, nested_com_inds, non_com,
                                     whole_com)
-                                f_freeze_changes = True
+                            except AttributeError as err:
+                                _error_exit(var_err_msg, err)
+                            f_freeze_changes = True
                     # Not 1 match in line
-                    elif (inline_optn_match[tag+raw_opt]) and\
-                            (not inline_setting_match[tag+raw_opt]):
+                    elif f_inline_optn_match and not f_inline_setting_match:
                         newline = _comment(line, line_num, fdb.com_ind)
                         if mtag and not fdb.f_multiline_active:
                             fdb.f_multiline_active = True
@@ -1083,14 +1414,11 @@ def _process_line(line: str,
 
 def _process_file(
     filepath: Path,
-    input_db: NTType,
-    optns_settings_db: NTType,
-    var_optns_values_db: NTType,
-    show_files_db: NTType
-) -> bool:
+    fsize: int,
+    input_db: NTType
+) -> Union[FileResult, None]:
     """Process individual file.
-    Update optns_settings_db and var_optns_values_db
-    Return if changes have been made or not
+    Return options and settings found and if changes have been made or not
 
     General algorithm is to scroll through file line by line, applying
     consistent logic to make build database of available options or to make the
@@ -1098,79 +1426,220 @@ def _process_file(
 
     Args:
         filepath (Path): file to process
+        fsize (int): size of file in bytes
         input_db (NTType): input database
-        optns_settings_db (NTType): options + settings database
-        var_optns_values_db (NTType): variable options + values database
-        show_files_db (NTType): show files database
 
     Returns:
-        bool: True if file changed else False
+        Union[FileResult, None]: Options and settings found and True if file
+            changed, or None if file is skipped
     """
-    logging.debug(f"FILE CANDIDATE: {filepath}")
+    logging.debug("FILE CANDIDATE: %s", filepath)
 
-    # Check file size and line count of file
-    linecount = _line_count(filepath, line_limit=input_db.max_flines)
-    fsize_kb = filepath.stat().st_size/1000
+    # Check file size before reading the file
+    fsize_kb = fsize/1000
     if fsize_kb > input_db.max_fsize_kb:
         reason_str = f"File exceeds kB size limit of {input_db.max_fsize_kb}"
         _skip_file_warning(filepath, reason=reason_str)
-        return False
+        return None
 
-    if linecount > input_db.max_flines:
-        reason_str = f"File exceeds line limit of {input_db.max_flines}"
-        _skip_file_warning(filepath,
-                           reason=reason_str)
-        return False
+    # Read file once; also checks encoding and line count of file
+    text = _read_text(filepath, line_limit=input_db.max_flines)
+    if text is None:
+        return None
 
-    # Instantiate and initialize file variables
-    fdb = FileVarsDatabase(filepath, input_db)
+    # When setting or renaming an option, skip files without that option
+    # before splitting the text into lines. Otherwise skip files without any
+    # option, unless all lines are traced for debugging.
+    inp = input_db
+    f_all_lines = logging.getLogger().isEnabledFor(logging.DEBUG)
+    f_set_optn = not (inp.f_available or inp.f_showfiles or inp.f_bashcomp)
+    if f_set_optn:
+        optn = input_db.clean_optn
+        if optn not in text:
+            return None
+    elif not (f_all_lines or TEXT_OPTN_SETTING_RE.search(text)):
+        return None
+    lines = io.StringIO(text, newline='\n').readlines()
 
     # Only continue if a comment index is found in the file
-    if not fdb.com_ind:
-        return False
-    logging.debug(f"FILE MATCHED [{fdb.com_ind}]: {filepath}")
-
-    # Read file and parse options in comments
-    with open(filepath, 'r', encoding='UTF-8') as file:
-        newlines = ['']*linecount
-        for idx, line in enumerate(_yield_utf8(file)):
-            line_num = idx + 1
-            newlines[idx] = _process_line(line, line_num, fdb,
-                                          optns_settings_db,
-                                          var_optns_values_db, show_files_db)
-
-    # Write file
+    com_ind = _get_comment_indicator(text, lines)
+    if not com_ind:
+        return None
+    logging.debug("FILE MATCHED [%s]: %s", com_ind, filepath)
+
+    # Instantiate and initialize file variables
+    fdb = FileVarsDatabase(filepath, input_db, com_ind)
+
+    # Only lines with an option and setting, or lines within an active
+    # multi-line option, need processing; find the former in a single search
+    # of the whole text. Process all lines to trace them when debugging.
+    # When setting an option, only lines with that option can change, but
+    # lines with a multi-line option ('*') also determine the nested level.
+    if f_all_lines:
+        optn_line_idxs = set(range(len(lines)))
+    else:
+        if f_set_optn:
+            optn_setting_re = _compile_text_set_optn_regex(optn)
+        else:
+            optn_setting_re = TEXT_OPTN_SETTING_RE
+        line_ends = list(accumulate(len(line) for line in lines))
+        optn_line_idxs = {bisect_right(line_ends, match.start())
+                          for match in optn_setting_re.finditer(text)}
+
+    # Parse options in comments; only modified lines are replaced in place
+    for idx, line in enumerate(lines):
+        if not (fdb.f_multiline_active or idx in optn_line_idxs):
+            continue
+        line_num = idx + 1
+        newline = _process_line(line, line_num, fdb)
+        if newline is not line and newline != line:
+            _log_before_after_commenting(line, newline, line_num)
+            lines[idx] = newline
+
+    # Write file only if its content changed
     if fdb.f_filemodified:
-        with open(filepath, 'w', encoding='UTF-8') as file:
-            file.writelines(newlines)
-        logging.print(f"File modified: {file.name}")  # type: ignore
-        return True
+        new_text = ''.join(lines)
+        if new_text == text:
+            fdb.f_filemodified = False
+        else:
+            _write_text(filepath, new_text)
+            logging.print("File modified: %s", filepath)  # type: ignore
+
+    return FileResult(f_filemodified=fdb.f_filemodified,
+                      optns_settings=fdb.optns_settings,
+                      var_optns_values=fdb.var_optns_values,
+                      showfiles_optns=fdb.showfiles_optns)
+
+
+def _process_files_worker(
+    file_infos: Sequence[Tuple[Path, int]],
+    input_db: NTType,
+    log_lvl: int
+) -> List[Tuple[Union[FileResult, None], List[logging.LogRecord], bool]]:
+    """Process a chunk of files in a worker process.
+
+    Log records are collected per file and returned so that the main process
+    can log them in file order. Processing stops at the first file that
+    exits on an error.
+
+    Args:
+        file_infos (Sequence[Tuple[Path, int]]): files to process and their
+            sizes in bytes
+        input_db (NTType): input database
+        log_lvl (int): log level of the main process
+
+    Returns:
+        List[Tuple[Union[FileResult, None], List[logging.LogRecord], bool]]:
+            File result, collected log records, and True if processing exited
+            on an error, for each processed file
+    """
+    logger = logging.getLogger()
+    logger.setLevel(log_lvl)
+    _add_print_level()
+
+    chunk_results: List[
+        Tuple[Union[FileResult, None], List[logging.LogRecord], bool]] = []
+    for file_info in file_infos:
+        collector = LogRecordCollector()
+        logger.handlers = [collector]
+        try:
+            result = _process_file(*file_info, input_db)
+        except SystemExit:
+            chunk_results.append((None, collector.records, True))
+            break
+        chunk_results.append((result, collector.records, False))
+
+    return chunk_results
+
+
+def _gather_file_result(
+    filepath: Path,
+    result: Union[FileResult, None],
+    optns_settings_db: DbType,
+    var_optns_values_db: DbType,
+    show_files_db: Union[FilesDbType, None]
+) -> bool:
+    """Add options and settings found in a file to the databases.
+
+    Args:
+        filepath (Path): processed file
+        result (Union[FileResult, None]): Result of processing the file
+        optns_settings_db (DbType): options + settings database
+        var_optns_values_db (DbType): variable options + values database
+        show_files_db (Union[FilesDbType, None]): show files database
+
+    Returns:
+        bool: True if file changed else False
+    """
+    if result is None:
+        return False
+
+    # Determine active, inactive, and simultaneous options
+    for optn, setting, f_active, f_inline_ambiguous in result.optns_settings:
+        settings_db = optns_settings_db.setdefault(optn, {})
+        setting_state = settings_db.get(setting)
+        if setting_state is None:
+            if f_inline_ambiguous:
+                settings_db[setting] = None
+            else:
+                settings_db[setting] = f_active
+        elif setting_state != f_active:
+            settings_db[setting] = '?'  # ambiguous
+        else:
+            pass
+
+    for optn, str_to_replace in result.var_optns_values:
+        var_optns_values_db.setdefault(optn, {})[str_to_replace] = '='
+
+    # Each file is gathered once, so each file is added once per option
+    if show_files_db is not None:
+        for optn in dict.fromkeys(result.showfiles_optns):
+            show_files_db.setdefault(optn, []).append(str(filepath))
+
+    return result.f_filemodified
+
 
-    return False
+def _can_fork_workers() -> bool:
+    """Check if worker processes can be forked safely.
+
+    Only fork where it is the default start method: on POSIX platforms
+    other than macOS, before Python 3.14, unless another start method was
+    set. Also do not fork a caller that runs other threads.
+
+    Returns:
+        bool: True if worker processes can be forked
+    """
+    start_method = multiprocessing.get_start_method(allow_none=True)
+    if start_method is None:
+        f_fork_default = sys.version_info < (3, 14)
+    else:
+        f_fork_default = start_method == 'fork'
+    if sys.platform in ('darwin', 'win32'):
+        f_fork_default = False
+    return f_fork_default and threading.active_count() == 1
 
 
 def _scroll_through_files(
-    valid_files: Sequence[Path],
+    valid_files: Sequence[Tuple[Path, int]],
     input_db: NTType
-) -> Tuple[DbType, DbType, Union[DbType, None], bool]:
+) -> Tuple[DbType, DbType, Union[FilesDbType, None], bool]:
     """Scroll through files, line by line.  This is heart of the code.
 
     Args:
-        valid_files (Sequence[Path]): List of valid files to run through
+        valid_files (Sequence[Tuple[Path, int]]): List of valid files to run
+            through and their sizes in bytes
         input_db (NTType): Database of options and settings
 
     Returns:
-        Tuple[DbType, DbType, Union[DbType, None], bool]: Output
-            data in a tuple
+        Tuple[DbType, DbType, Union[FilesDbType, None], bool]:
+            Output data in a tuple
     """
     inp = input_db
-    optns_settings_db: DbType = defaultdict(lambda: defaultdict(lambda: None))
-    var_optns_values_db: DbType = defaultdict(
-        lambda: defaultdict(lambda: None)
-    )
-    show_files_db: Union[DbType, None] = None
+    optns_settings_db: DbType = {}
+    var_optns_values_db: DbType = {}
+    show_files_db: Union[FilesDbType, None] = None
     if inp.f_showfiles:
-        show_files_db = defaultdict(lambda: defaultdict(lambda: None))
+        show_files_db = {}
     f_changes_made = False
 
     if inp.f_available or inp.f_showfiles:
@@ -1180,11 +1649,47 @@ def _scroll_through_files(
         logging.info(("Scrolling through files to set: {inp.tag}{inp.raw_opt} "
                       "{inp.setting}").format(inp=input_db))
 
-    for filepath in valid_files:
-        f_file_changed = _process_file(filepath, input_db, optns_settings_db,
-                                       var_optns_values_db, show_files_db)
-        if f_file_changed:
-            f_changes_made = True
+    # Only gather options in parallel: no file is written, so an error exit
+    # cannot leave some files modified, as it could when setting an option.
+    # Fork the worker processes, so that the calling script is not
+    # re-imported by them; where forking is not safe, process serially.
+    f_read_only = inp.f_available or inp.f_showfiles
+    f_fork = _can_fork_workers()
+    max_workers = os.cpu_count() or 1
+    f_many_files = len(valid_files) >= MIN_FILES_PARALLEL
+    if f_read_only and f_fork and max_workers > 1 and f_many_files:
+        # Process chunks of files in parallel to limit inter-process
+        # overhead; gather results and logs in file order
+        logger = logging.getLogger()
+        worker = partial(_process_files_worker, input_db=input_db,
+                         log_lvl=logger.level)
+        chunksize = max(1, len(valid_files) // (4*max_workers))
+        chunks = [valid_files[idx:idx + chunksize]
+                  for idx in range(0, len(valid_files), chunksize)]
+        with ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context('fork')) as executor:
+            futures = [executor.submit(worker, chunk) for chunk in chunks]
+            for chunk, future in zip(chunks, futures):
+                for (filepath, _), (result, records, f_exited) in zip(
+                        chunk, future.result()):
+                    for record in records:
+                        logger.handle(record)
+                    if f_exited:  # error already logged by worker
+                        for future_ in futures:
+                            future_.cancel()
+                        sys.exit()
+                    if _gather_file_result(filepath, result,
+                                           optns_settings_db,
+                                           var_optns_values_db,
+                                           show_files_db):
+                        f_changes_made = True
+    else:
+        for filepath, fsize in valid_files:
+            result = _process_file(filepath, fsize, input_db)
+            if _gather_file_result(filepath, result, optns_settings_db,
+                                   var_optns_values_db, show_files_db):
+                f_changes_made = True
 
     # Cut out options with a singular setting. Could try filter() here
     optns_settings_db = {
@@ -1194,42 +1699,80 @@ def _scroll_through_files(
             f_changes_made)
 
 
-def _fn_compare(glob_set: Sequence[str], compare_array: Sequence[str]) -> bool:
-    """Compare set with unix * expressions with array of files or directories.
+@lru_cache(maxsize=None)
+def _compile_globs(glob_set: Tuple[str, ...]) -> Pattern:
+    """Compile glob-style expressions into a single regular expression.
 
     Args:
-        glob_set (Sequence[str]): Sequence of glob-style search inputs
-        compare_array (Sequence[str]): Sequence to compare to
+        glob_set (Tuple[str, ...]): Glob-style expressions to combine
 
     Returns:
-        bool: True if match is found else False
+        Pattern: Regular expression that matches any of the expressions, to
+            be matched against os.path.normcase of a name
     """
-    for glob_ in glob_set:
-        for cmpr in compare_array:
-            if fnmatch(cmpr, glob_):
-                return True
-    return False
+    if not glob_set:
+        return re.compile(r'(?!)')  # matches nothing
+    return re.compile('|'.join(translate(os.path.normcase(glob_))
+                               for glob_ in glob_set))
 
 
 def _gen_valid_files(
     ignore_files: Sequence[str],
     ignore_dirs: Sequence[str]
-) -> Generator[Path, None, None]:
+) -> Generator[Tuple[Path, int], None, None]:
     """Generator to get non-ignored files in non-ignored directories.
 
+    Directories are scanned top-down in the same order as os.walk with
+    followlinks=True. Each directory is scanned once, so a symbolic link to
+    a directory that was already scanned, such as a link cycle, is not
+    followed. Ignored directories are pruned before they are descended
+    into, and file sizes are taken from the directory scan.
+
     Args:
         ignore_files (Sequence[str]): files to ignore
         ignore_dirs (Sequence[str]): directories to ignore
 
     Yields:
-        Generator[Path]: valid files, one at a time
+        Generator[Tuple[Path, int]]: valid files and their sizes in bytes,
+            one at a time
     """
-    for dirpath, _, files in os.walk('.', followlinks=True):
-        if not _fn_compare(ignore_dirs, dirpath.split(os.sep)):
-            for file in files:
-                baseFileName = Path(file).name
-                if not _fn_compare(ignore_files, (baseFileName,)):
-                    yield Path(f"{dirpath}/{file}")
+    ignore_files_re = _compile_globs(tuple(ignore_files))
+    ignore_dirs_re = _compile_globs(tuple(ignore_dirs))
+    scanned_dirs = set()  # (device, inode) of each scanned directory
+    dir_stack = ['.']
+    while dir_stack:
+        dirpath = dir_stack.pop()
+        try:
+            dir_stat = os.stat(dirpath)
+            dir_id = (dir_stat.st_dev, dir_stat.st_ino)
+            if dir_id in scanned_dirs:
+                continue
+            scanned_dirs.add(dir_id)
+            scandir_it = os.scandir(dirpath)
+        except OSError:  # unreadable directory, skip as os.walk does
+            continue
+        subdirs = []
+        with scandir_it as entries:
+            for entry in entries:
+                try:
+                    f_dir = entry.is_dir()
+                except OSError:  # not a directory, as os.walk assumes
+                    f_dir = False
+                if f_dir:
+                    if not ignore_dirs_re.match(os.path.normcase(entry.name)):
+                        subdirs.append(entry.path)
+                    continue
+                if ignore_files_re.match(os.path.normcase(entry.name)):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    fsize = entry.stat().st_size
+                except OSError as err:  # such as a symbolic link loop
+                    _skip_file_warning(Path(entry.path), reason=str(err))
+                    continue
+                yield Path(entry.path), fsize
+        dir_stack.extend(reversed(subdirs))  # visit in scanned order
 
 
 def _str_dict(dict_: Mapping[str, object]) -> Mapping[str, str]:
@@ -1279,7 +1822,7 @@ def _load_program_settings(args: argparse.Namespace) -> Dict[str, Any]:
     secn = 'Files'
 
     if config_file.exists():
-        logging.info(f"Reading program settings from {config_file}:")
+        logging.info("Reading program settings from %s:", config_file)
         cfg.read(config_file)
         config['max_flines'] = int(cfg[secn].get('max_flines'))
         config['max_fsize_kb'] = int(cfg[secn].get('max_fsize_kb'))
@@ -1320,8 +1863,8 @@ def _check_setting_fmt(setting_str: str) -> str:
         str: Formatted setting
     """
     with _handle_errors(err_types=(AttributeError,), msg=INVALID_SETTING_MSG):
-        setting = re.search(f"(^{VALID_INPUT_SETTING}$)",  # type: ignore
-                            setting_str).group(0)
+        setting = INPUT_SETTING_RE.search(  # type: ignore
+            setting_str).group(0)
     return setting
 
 
@@ -1334,10 +1877,8 @@ def _check_optn_fmt(optn_str: str) -> Tuple[str, str]:
     Returns:
         Tuple[str, str]: Literal tag string and raw option string
     """
-    check_tag_option_re = re.compile(
-        "^({mtag}*)({tag}+)({raw_opt})$".format(**GENERIC_RE_VARS))
     with _handle_errors(err_types=(AttributeError,), msg=INVALID_OPTN_MSG):
-        _, tag, raw_opt = check_tag_option_re.search(  # type: ignore
+        _, tag, raw_opt = INPUT_OPTN_RE.search(  # type: ignore
             optn_str).groups()
     literal_tag = ''.join([rf'\{s}' for s in tag])  # read as literal
     return literal_tag, raw_opt
@@ -1356,11 +1897,6 @@ def _parse_and_check_input(
     Returns:
         NTType: Input database
     """
-    InputDb = namedtuple('InputDb',
-                         ['tag', 'raw_opt', 'setting', 'f_available',
-                          'f_showfiles', 'f_bashcomp', 'rename_optn',
-                          'rename_setting', 'max_flines', 'max_fsize_kb', ])
-
     # Check if renaming an option
     if args.rename_optn or args.rename_setting:
         #  No setting, available, and showfiles arguments if renaming option
@@ -1402,7 +1938,9 @@ def _parse_and_check_input(
                    f_bashcomp=args.bashcomp, rename_optn=args.rename_optn,
                    rename_setting=args.rename_setting,
                    max_flines=config['max_flines'],
-                   max_fsize_kb=config['max_fsize_kb'])
+                   max_fsize_kb=config['max_fsize_kb'],
+                   clean_optn=(tag_ + raw_opt_).replace('\\', ''),
+                   clean_setting=setting_.replace('\\', ''))
 
 
 def optionset(args_arr: Sequence[str]) -> bool:
@@ -1418,11 +1956,10 @@ def optionset(args_arr: Sequence[str]) -> bool:
     start_time = time()  # time program
 
     # Parse arguments
-    args, parser = _parse_args(args_arr)
+    args, _ = _parse_args(args_arr)
 
     if args.help_full:
-        parser.description = FULL_HELP_DESCRIPTION
-        parser.print_help()
+        _build_parser(FULL_HELP_DESCRIPTION).print_help()
         return True
 
     if args.version:
@@ -1436,16 +1973,17 @@ def optionset(args_arr: Sequence[str]) -> bool:
     logging.info("Executing main optionset function")
 
     logging.info("Checking input options")
-    logging.debug(f"args = {args}")
+    logging.debug("args = %s", args)
     config = _load_program_settings(args)
     input_db = _parse_and_check_input(args, config)
-    logging.info(f"<tag><raw_opt> <setting> = "
-                 f"{input_db.tag}{input_db.raw_opt} {input_db.setting}")
+    logging.info("<tag><raw_opt> <setting> = %s%s %s",
+                 input_db.tag, input_db.raw_opt, input_db.setting)
 
     logging.info("Generating valid files")
     valid_files = list(_gen_valid_files(config['ignore_files'],
                                         config['ignore_dirs']))
-    logging.info(f"Valid files: {[str(vf) for vf in valid_files]}")
+    if logging.getLogger().isEnabledFor(logging.INFO):
+        logging.info("Valid files: %s", [str(vf) for vf, _ in valid_files])
 
     optns_settings_db, var_optns_values_db, show_files_db, f_changes_made \
         = _scroll_through_files(valid_files, input_db=input_db)
@@ -1458,7 +1996,6 @@ def optionset(args_arr: Sequence[str]) -> bool:
     if args.bashcomp:
         bashcomp_path_ = Path(args.aux_dir) / BASHCOMP_NAME
         _write_bashcompletion_file(optns_settings_db, var_optns_values_db,
-                                   help_str=parser.format_help(),
                                    bashcomp_path=bashcomp_path_)
 
     if f_changes_made:
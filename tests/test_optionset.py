@@ -13,6 +13,7 @@ import re
 import shlex
 import shutil
 import sys
+import tempfile
 import time
 import unittest
 
@@ -20,8 +21,15 @@ from contextlib import redirect_stdout
 from io import StringIO
 from pathlib import Path
 from subprocess import run, PIPE, STDOUT
+from unittest import mock
 
 from optionset.optionset import optionset, LOG_NAME, MAX_FLINES, MAX_FSIZE_KB
+from optionset.optionset import _add_left_right_groups, _find_unescaped
+from optionset.optionset import _add_print_level, _check_varop_groups
+from optionset.optionset import _can_fork_workers
+from optionset.optionset import _split_line, GENERIC_RE_VARS, PRINT_LVL
+from optionset.optionset import UNCOMMD_LINE, WHOLE_COMMENT
+from optionset.optionset import _write_text
 
 THIS_DIR = Path(__file__).parent
 TEST_DIR = THIS_DIR
@@ -59,10 +67,10 @@ def ut_test_regex(regex, str_to_search):
     return False
 
 
-def run_cmd(cmd_str, check=True):
+def run_cmd(cmd_str, check=True, cwd=None):
     """Run a command and return the output. """
     subproc = run(shlex.split(cmd_str), capture_output=False, stdout=PIPE,
-                  stderr=STDOUT, check=check)
+                  stderr=STDOUT, check=check, cwd=cwd)
     output_str = subproc.stdout.decode('UTF-8')
     return output_str, subproc.returncode
 
@@ -468,10 +476,6 @@ INFO:Valid files: \[.*\]
 INFO:Scrolling through files to set: \\@none none
 INFO:Skipping: filesToTest/shouldIgnore/binaryFile.dat
 \s+'utf-8' codec can't decode byte 0xd9 in position 8:.*
-INFO:Skipping: filesToTest/shouldIgnore/binaryFile.dat
-\s+'utf-8' codec can't decode byte 0xd9 in position 8:.*
-INFO:Skipping: filesToTest/shouldIgnore/binaryFile.dat
-\s+'utf-8' codec can't decode byte 0xd9 in position 8:.*
 INFO:Skipping: filesToTest/shouldIgnore/tooLarge100kB.dat
 \s+File exceeds kB size limit of 100
 INFO:Skipping: filesToTest/shouldIgnore/tooManyLines.dat
@@ -587,6 +591,380 @@ class TestSets(unittest.TestCase):
         self.assertEqual(output_str, "", msg=self.checkDiffMsg)
 
 
+@unittest.skipIf(False, "Skipping file handling tests")
+class TestFileHandling(unittest.TestCase):
+    """Test file handling on small files in a temporary directory. """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.aux_dir = Path(self.tmp_dir.name) / "aux"
+        self.work_dir = Path(self.tmp_dir.name) / "work"
+        self.work_dir.mkdir()
+
+    def write_files(self, files):
+        """Write dictionary of relative file paths and text. """
+        for filename, text in files.items():
+            filepath = self.work_dir / filename
+            filepath.parent.mkdir(parents=True, exist_ok=True)
+            with open(filepath, 'w', encoding='UTF-8', newline='') as file:
+                file.write(text)
+
+    def read_files(self):
+        """Return dictionary of relative file paths and text. """
+        files = {}
+        for path in sorted(self.work_dir.rglob('*')):
+            if path.is_file():
+                with open(path, encoding='UTF-8', newline='') as file:
+                    files[str(path.relative_to(self.work_dir))] = file.read()
+        return files
+
+    def run_app(self, args_str):
+        """Run command-line interface in the work directory. """
+        output_str, _ = run_cmd(
+            f"{BIN_PATH} --auxiliary-dir={self.aux_dir} {args_str}",
+            cwd=self.work_dir)
+        return output_str
+
+    def read_log(self):
+        """Return log file text. """
+        return (self.aux_dir / LOG_NAME).read_text(encoding='UTF-8')
+
+    def test_skip_files_without_option(self):
+        """Test that files without the option are skipped and leave the
+        verbose and debug output unchanged. """
+        optn_file = {'optn.py': "a = 1  # @opt x\n# a = 2  # @opt y\n"}
+        no_optn_file = {'noOptn.py': "# Comment @other\nb = 2  # opt x\n"}
+        re_run_dependent = re.compile(
+            r".*(Valid files:|CANDIDATE: noOptn|Finished in).*\n?")
+        for args_str in ("-v @opt y", "-d @opt y", "-v -a @opt"):
+            outputs = []
+            for files in (optn_file, {**optn_file, **no_optn_file}):
+                shutil.rmtree(self.aux_dir, ignore_errors=True)
+                shutil.rmtree(self.work_dir)
+                self.write_files(files)
+                no_optn_path = self.work_dir / 'noOptn.py'
+                no_optn_mtime = (no_optn_path.stat().st_mtime_ns
+                                 if no_optn_path.exists() else None)
+                output_str = self.run_app(args_str) + self.read_log()
+                outputs.append(re_run_dependent.sub('', output_str))
+                if no_optn_mtime is not None:
+                    self.assertEqual(no_optn_path.stat().st_mtime_ns,
+                                     no_optn_mtime)
+            self.assertNotIn("noOptn", outputs[1])
+            self.assertEqual(outputs[0], outputs[1], msg=args_str)
+
+    def test_option_line_selection(self):
+        """Test that lines found by searching the whole text give the same
+        result as processing every line, as is done when debugging. """
+        files = {'firstLast.py': ("a = 1  # @opt x\n# a = 2  # @opt y\n"
+                                  "b = 3\n# c = 4  # @opt x"),
+                 'crlf.py': "# Header\r\nd = 1  # @opt x\r\n"
+                            "# d = 2  # @opt y\r\n",
+                 'multiline.py': ("e = 1  # *@opt x\ne = 2\n"
+                                  "e = 3  # *@opt x\n# f = 1  # @opt y\n"),
+                 'noNewline.py': "# g = 1  # @opt y\ng = 2  # @opt x\n# g"}
+        for args_str in ("-a", "@opt y", "@opt x", "-f @opt"):
+            results = []
+            for debug_str in ("", "-d"):
+                shutil.rmtree(self.aux_dir, ignore_errors=True)
+                shutil.rmtree(self.work_dir)
+                self.write_files(files)
+                output_str = self.run_app(f"{debug_str} {args_str}")
+                results.append((output_str, self.read_files()))
+            self.assertEqual(results[0], results[1], msg=args_str)
+            if args_str == "@opt y":
+                for filename, text in results[0][1].items():
+                    self.assertNotEqual(text, files[filename], msg=filename)
+
+    @unittest.skipIf(not hasattr(os, 'symlink'), "No symbolic links")
+    def test_linked_directories(self):
+        """Test that linked directories are followed, except link cycles. """
+        linked_dir = Path(self.tmp_dir.name) / "linked"
+        linked_dir.mkdir()
+        (self.work_dir / 'real').mkdir()
+        os.symlink(linked_dir, self.work_dir / 'link',
+                   target_is_directory=True)
+        os.symlink('..', self.work_dir / 'real' / 'cycle',
+                   target_is_directory=True)
+        optn_text = "a = 1  # @opt x\n# a = 2  # @opt y\n"
+        filepaths = (self.work_dir / 'real' / 'optn.py',
+                     linked_dir / 'optn.py')
+        for filepath in filepaths:
+            filepath.write_text(optn_text, encoding='UTF-8')
+
+        output_str = self.run_app("@opt -f")
+        re_files = re.compile(r"^  (.*optn\.py.*)$", re.MULTILINE)
+        files_strs = re_files.findall(output_str)
+        self.assertEqual(len(files_strs), 1, msg=output_str)
+        self.assertEqual(sorted(files_strs[0].split()),
+                         ["link/optn.py", "real/optn.py"], msg=output_str)
+
+        self.run_app("@opt y")
+        for filepath in filepaths:
+            self.assertEqual(filepath.read_text(encoding='UTF-8'),
+                             "#a = 1  # @opt x\n a = 2  # @opt y\n")
+
+    @unittest.skipIf(not hasattr(os, 'symlink'), "No symbolic links")
+    def test_unreadable_entry(self):
+        """Test that an entry that cannot be read, such as a symbolic link
+        loop, is skipped without skipping the rest of its directory. """
+        optn_text = "a = 1  # @opt x\n# a = 2  # @opt y\n"
+        self.write_files({'sub/optn.py': optn_text, 'optn.py': optn_text})
+        os.symlink('loop', self.work_dir / 'loop')
+
+        output_str = self.run_app("-f")
+        re_files = re.compile(r"^  (.*optn\.py.*)$", re.MULTILINE)
+        files_strs = re_files.findall(output_str)
+        self.assertEqual(len(files_strs), 1, msg=output_str)
+        self.assertEqual(sorted(files_strs[0].split()),
+                         ["optn.py", "sub/optn.py"], msg=output_str)
+        self.assertRegex(self.read_log(), r"Skipping: loop\n\t.*loop")
+
+        self.run_app("@opt y")
+        for filename in ('optn.py', 'sub/optn.py'):
+            self.assertEqual(
+                (self.work_dir / filename).read_text(encoding='UTF-8'),
+                "#a = 1  # @opt x\n a = 2  # @opt y\n")
+
+    def run_app_forced(self, args_str, f_parallel):
+        """Run imported optionset function in the work directory, forcing
+        files to be processed in parallel or serially. Return output and True
+        if a process pool was used. """
+        min_files = 1 if f_parallel else sys.maxsize
+        script_str = f"""
+import importlib, sys
+from unittest import mock
+opset = importlib.import_module('optionset.optionset')
+mock.patch.object(opset, 'MIN_FILES_PARALLEL', {min_files}).start()
+mock.patch('os.cpu_count', return_value=4).start()
+pool = mock.patch.object(opset, 'ProcessPoolExecutor',
+                         wraps=opset.ProcessPoolExecutor).start()
+try:
+    opset.optionset(sys.argv[1:])
+finally:
+    print(f"POOL USED: {{pool.called}}")
+"""
+        args = [sys.executable, '-c', script_str,
+                f"--auxiliary-dir={self.aux_dir}", *shlex.split(args_str)]
+        output_str = run(args, stdout=PIPE, stderr=STDOUT, check=True,
+                         cwd=self.work_dir).stdout.decode('UTF-8')
+        output_str, pool_str = output_str.rsplit("POOL USED: ", 1)
+        return output_str, pool_str.strip() == 'True'
+
+    def test_parallel_files(self):
+        """Test that processing files in parallel gives the same output, log,
+        and files as processing them serially, and that files are only
+        processed in parallel when gathering options. """
+        files = {}
+        for idx in range(12):
+            files[f"dir{idx % 3}/file{idx}.py"] = (
+                f"a = {idx}  # @opt x\n# a = 0  # @opt y\n"
+                f"b = {idx}  # @varOpt ='b = (.*)'\n")
+        files['dir0/noOptn.py'] = "# Comment\nc = 1\n"
+        for args_str, f_pool in (("-a", True), ("-v -f @opt", True),
+                                 ("-d -a @var", True), ("-v @opt y", False)):
+            results = []
+            for f_parallel in (True, False):
+                shutil.rmtree(self.aux_dir, ignore_errors=True)
+                shutil.rmtree(self.work_dir)
+                self.write_files(files)
+                output_str, f_pool_used = self.run_app_forced(args_str,
+                                                              f_parallel)
+                self.assertEqual(f_pool_used, f_parallel and f_pool,
+                                 msg=args_str)
+                results.append((re.sub(r"Finished in .*", '', output_str),
+                                re.sub(r"Finished in .*", '', self.read_log()),
+                                self.read_files()))
+            self.assertEqual(results[0], results[1], msg=args_str)
+
+    def test_unchanged_file_not_written(self):
+        """Test that a file is not written when its options are already set.
+        """
+        self.write_files({'optn.py': "a = 1  # @opt x\n# a = 2  # @opt y\n"})
+        filepath = self.work_dir / 'optn.py'
+        os.utime(filepath, ns=(0, 0))
+        stat_before = filepath.stat()
+        output_str = self.run_app("@opt x")
+        self.assertNotIn("File modified", output_str)
+        stat_after = filepath.stat()
+        self.assertEqual(stat_after.st_mtime_ns, stat_before.st_mtime_ns)
+        self.assertEqual(stat_after.st_ino, stat_before.st_ino)
+
+    def test_write_text(self):
+        """Test that a file is replaced atomically, keeping its mode. """
+        self.write_files({'file.txt': "old\n"})
+        filepath = self.work_dir / 'file.txt'
+        filepath.chmod(0o640)
+        inode = filepath.stat().st_ino
+        _write_text(filepath, "new\n")
+        self.assertEqual(self.read_files(), {'file.txt': "new\n"})
+        self.assertNotEqual(filepath.stat().st_ino, inode)
+        self.assertEqual(filepath.stat().st_mode & 0o777, 0o640)
+
+        # A failed replacement leaves the file and no temporary file behind
+        with mock.patch('os.replace', side_effect=OSError):
+            with self.assertRaises(OSError):
+                _write_text(filepath, "newer\n")
+        self.assertEqual(self.read_files(), {'file.txt': "new\n"})
+
+    @unittest.skipIf(getattr(os, 'geteuid', lambda: -1)() != 0,
+                     "Changing owner requires root")
+    def test_write_text_owner(self):
+        """Test that replacing a file keeps its owner and group. """
+        self.write_files({'file.txt': "old\n"})
+        filepath = self.work_dir / 'file.txt'
+        os.chown(filepath, 1234, 5678)
+        _write_text(filepath, "new\n")
+        self.assertEqual(self.read_files(), {'file.txt': "new\n"})
+        self.assertEqual((filepath.stat().st_uid, filepath.stat().st_gid),
+                         (1234, 5678))
+
+    def test_write_text_in_place(self):
+        """Test that a file is written in place if it has hard links or a
+        temporary file cannot be created. """
+        self.write_files({'file.txt': "old\n"})
+        filepath = self.work_dir / 'file.txt'
+        linkpath = self.work_dir / 'link.txt'
+        os.link(filepath, linkpath)
+        _write_text(filepath, "new\n")
+        self.assertEqual(self.read_files(),
+                         {'file.txt': "new\n", 'link.txt': "new\n"})
+        linkpath.unlink()
+
+        inode = filepath.stat().st_ino
+        with mock.patch('tempfile.mkstemp', side_effect=PermissionError):
+            _write_text(filepath, "newer\n")
+        self.assertEqual(self.read_files(), {'file.txt': "newer\n"})
+        self.assertEqual(filepath.stat().st_ino, inode)
+
+
+def split_line_re(line, com_ind, nested_lvl):
+    """Split line with the commented and uncommented line regular expressions
+    that _split_line replaces. """
+    re_vars = {**GENERIC_RE_VARS, 'com_ind': com_ind,
+               'nested_com_inds': rf"\s*{com_ind}" * nested_lvl}
+    commd_line = ''.join((r'^(?P<nested_com_inds>{nested_com_inds})',
+                          r'(?P<non_com>\s*{com_ind}(?:(?!{com_ind}).)+)',
+                          WHOLE_COMMENT))
+    for line_re, f_comment in ((commd_line, True), (UNCOMMD_LINE, False)):
+        line_match = re.search(line_re.format(**re_vars), line)
+        if line_match:
+            return (*line_match.group('nested_com_inds', 'non_com',
+                                      'whole_com'), f_comment)
+    return None
+
+
+@unittest.skipIf(False, "Skipping internal function tests")
+class TestInternals(unittest.TestCase):
+    """Test internal functions directly. """
+
+    def test_find_unescaped(self):
+        """Test finding delimiters that are not escaped or in a class. """
+        cases = ((r'a(b)', '(', 1),
+                 (r'a(b)', ')', 3),
+                 (r'\(a(b)', '(', 3),  # escaped delimiter is skipped
+                 (r'\\(a)', '(', 2),  # escaped backslash, then delimiter
+                 (r'\\\(a(', '(', 5),
+                 (r'ab)', ')', 2),  # delimiter at end of string
+                 (r'ab\)', ')', -1),  # escaped delimiter at end of string
+                 ('ab\\', '(', -1),  # backslash at end of string
+                 (r'[(]a(', '(', 4),  # delimiter in character class
+                 (r'[^;)]*)', ')', 6),
+                 (r'[])](a)', ')', 6),  # literal ']' starts class
+                 (r'[^]\)]a)', ')', 7),
+                 (r'ab', '(', -1),
+                 (r'', '(', -1),)
+        for string, char, idx in cases:
+            self.assertEqual(_find_unescaped(string, char), idx,
+                             msg=f"{string!r}, {char!r}")
+
+    def test_add_left_right_groups(self):
+        """Test adding groups to the left and right of the variable group. """
+        cases = ((r'\( (.*) 0 0 \)', r'(\( )(.*)( 0 0 \))'),
+                 (r'(.*) 0 0', r'()(.*)( 0 0)'),
+                 (r'a = (.*)', r'(a = )(.*)()'),
+                 (r'\\(\d+)\)', r'(\\)(\d+)(\))'),
+                 (r'\(\) (\w)', r'(\(\) )(\w)()'),
+                 (r'f\(x\) = ([^;)]*);', r'(f\(x\) = )([^;)]*)(;)'),)
+        for inline_re, new_inline_re in cases:
+            self.assertEqual(_add_left_right_groups(inline_re), new_inline_re,
+                             msg=inline_re)
+            self.assertEqual(re.compile(new_inline_re).groups, 3)
+
+    def test_check_varop_groups(self):
+        """Test that a variable setting regex has exactly one group. """
+        _add_print_level()
+        valid_re_strs = (r'(.*)', r'(.*) 0 0', r'= (\d+) units',
+                         r'\( (.*) 0 0 \)', r'\\(.*)', r'((?:a|b)c)',
+                         r'= ([^;)]*);', r'f\(x\) = ([^;)]*);')
+        for re_str in valid_re_strs:
+            self.assertIsNone(_check_varop_groups(re_str), msg=re_str)
+
+        invalid_re_strs = (
+            (r'abc', "No regex groups found"),
+            (r'\(.*\)', "No regex groups found"),
+            (r'(a) (b)', "More than one regex group"),
+            (r'((a|b)c)', "More than one regex group"),
+            (r'(.*', "Invalid regular expression"),
+            (r'.*)', "Invalid regular expression"),
+            (r'(a))(', "Invalid regular expression"),
+            (r'\\(a\)', "Invalid regular expression"),)
+        for re_str, problem_str in invalid_re_strs:
+            with self.assertLogs(level=PRINT_LVL) as logs:
+                with self.assertRaises(AttributeError, msg=re_str):
+                    _check_varop_groups(re_str)
+            self.assertIn(f"InvalidRegexGroupError: {problem_str}",
+                          logs.output[0], msg=re_str)
+
+    def test_can_fork_workers(self):
+        """Test that worker processes are only forked where fork is the
+        default start method and the caller runs no other threads. """
+        cases = (('linux', 'fork', 1, True),
+                 ('linux', None, 1, sys.version_info < (3, 14)),
+                 ('linux', 'spawn', 1, False),
+                 ('linux', 'forkserver', 1, False),
+                 ('linux', 'fork', 2, False),
+                 ('darwin', 'fork', 1, False),
+                 ('darwin', None, 1, False),
+                 ('win32', None, 1, False),)
+        for platform, start_method, num_threads, f_fork in cases:
+            with mock.patch('sys.platform', platform), \
+                    mock.patch('multiprocessing.get_start_method',
+                               return_value=start_method), \
+                    mock.patch('threading.active_count',
+                               return_value=num_threads):
+                self.assertEqual(_can_fork_workers(), f_fork,
+                                 msg=f"{platform}, {start_method}")
+
+    def test_split_line(self):
+        """Test splitting lines the same as the line regular expressions. """
+        line_fmts = ("{c}\n",
+                     "{c} @opt a\n",
+                     "{c}{c} @opt a\n",
+                     "code  {c} @opt a\n",
+                     "code  {c} @opt a",
+                     "code  {c}@opt a\n",
+                     "code = 1  {c} @opt a {c} @opt b\n",
+                     "{c}code  {c} @opt a\n",
+                     "  {c} code = 1  {c} @opt a {c} note\n",
+                     "{c}{c}code  {c} @opt a\n",
+                     "  {c}  {c} code  {c} *@opt a\n",
+                     " {c} {c}{c} code  {c} @opt a\n",
+                     "{c} {c} code\n",
+                     "code  {c} not an option\n",
+                     "code  {c} @opt ='(.*)' \n",
+                     "code\r\n",
+                     "code  {c} @opt a\r\n",)
+        for com_ind in ('#', '%', '!', '//', '--'):
+            for line_fmt in line_fmts:
+                line = line_fmt.format(c=com_ind)
+                for nested_lvl in range(3):
+                    self.assertEqual(_split_line(line, com_ind, nested_lvl),
+                                     split_line_re(line, com_ind, nested_lvl),
+                                     msg=f"{line!r}, {nested_lvl}")
+
+
 def mkdirs(dir_str):
     """Make directory if it does not exist. """
     if not os.path.exists(dir_str):